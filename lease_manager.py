@@ -1,12 +1,43 @@
 #!/usr/bin/env python3
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request
 import csv
+import gzip
+import ipaddress
 import json
 import os
 import re
+import socket
+import struct
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict
 from datetime import datetime
+from functools import lru_cache
+from operator import itemgetter
 from flask_moment import Moment
+from markupsafe import escape
+
+try:
+    import numpy as np
+except ImportError:  # Optional, dates are formatted one at a time instead
+    np = None
+
+try:
+    import hyperscan
+except ImportError:  # Optional, _SUBNET_RE is used instead
+    hyperscan = None
+
+try:
+    import orjson
+except ImportError:  # Optional, the json module is used instead
+    orjson = None
+
+try:
+    from waitress import serve
+except ImportError:  # Optional, Flask's built-in server is used instead
+    serve = None
 
 app = Flask(__name__)
 moment = Moment(app)
@@ -15,136 +46,473 @@ moment = Moment(app)
 LEASE_FILE = "/tmp/kea-leases4.csv"
 KEA_CONFIG_FILE = "/etc/kea/kea-dhcp4.conf"
 
-def read_lease_file():
-    """Read and parse the Kea lease file, handling duplicates"""
-    leases = []
-    lease_dict = {}  # Dictionary to track most recent lease per IP
+# Seconds between checks of the lease file by the background refresher
+LEASE_POLL_INTERVAL = 2
+
+# Parsed lease file, replaced as a whole whenever its mtime/size changes
+_EMPTY_SNAPSHOT = {
+    'key': None,
+    'leases': [],
+    'by_ip': {},
+    'history_by_ip': {},
+    'with_hostname': 0,
+    'expiries': [],
+    'leases_json': b'{"leases":[]}',
+    'leases_json_gz': gzip.compress(b'{"leases":[]}'),
+    'etag': None,
+    'tbody_html': '',
+    'error': None,
+}
+_SNAPSHOT = _EMPTY_SNAPSHOT
+_SNAPSHOT_LOCK = threading.Lock()
+_WATCHER = None
+_WATCHER_LOCK = threading.Lock()
+
+# Latest epoch timestamp datetime can represent (9999-12-31 23:59:59 UTC)
+_MAX_TIMESTAMP = 253402300799
+
+# Big-endian unpacker turning inet_aton's 4 bytes into one integer
+_unpack_u32 = struct.Struct('>I').unpack
+
+# One row of the lease table, rendered in Python rather than a Jinja loop
+_ROW_TMPL = '''
+                    <tr class="lease-row">
+                        <td class="ip-cell">{ip}</td>
+                        <td class="mac-cell">{mac}</td>
+                        <td class="hostname-cell">{hostname_cell}</td>
+                        <td>{expire}</td>
+                        <td>{subnet_id}</td>
+                        <td>
+                            <button class="action-btn" onclick="showReservation('{ip}', '{mac}', '{hostname}')">
+                                Make Static
+                            </button>
+                            <button class="history-btn" onclick="showHistory('{ip}')">
+                                History
+                            </button>
+                        </td>
+                    </tr>'''.format
+
+# (mtime_ns, subnets) from the Kea config, replaced as a single tuple
+_SUBNET_CACHE = (-1, {})
+
+# Fallback for Kea configs that are not strict JSON (e.g. with comments)
+_SUBNET_RE = re.compile(r'"id":\s*(\d+).*?"subnet":\s*"([^"]+)"', re.DOTALL)
+
+# The two halves of _SUBNET_RE, for pairing up Hyperscan matches
+_SUBNET_ID_RE = re.compile(rb'"id":\s*(\d+)')
+_SUBNET_RANGE_RE = re.compile(rb'"subnet":\s*"([^"]+)"')
+
+# Reservation instructions, filled in by generate_reservation_config
+_INSTRUCTIONS_TMPL = """
+To add this static reservation to your Kea DHCP4 configuration:
+
+1. Edit your Kea configuration file:
+   vi {config_file}
+
+2. Find the subnet4 section for your network and add the reservation:
+
+   "subnet4": [
+     {{
+       "subnet": "192.168.20.0/24",
+       "pools": [
+         {{ "pool": "192.168.20.100-192.168.20.200" }}
+       ],
+       "reservations": [
+         {{
+           "hw-address": "{mac}",
+           "ip-address": "{ip}"{host_line}
+         }}
+       ]
+     }}
+   ]
+
+3. Test the configuration:
+   kea-dhcp4 -t {config_file}
+
+4. Restart Kea DHCP4:
+   /etc/init.d/kea-dhcp4 restart
+
+5. Check the status:
+   /etc/init.d/kea-dhcp4 status
+""".format
+
+@lru_cache(maxsize=4096)
+def _format_timestamp(ts):
+    """Format an epoch timestamp; leases granted together share expiry times"""
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+
+def _split_expire(expire_ts):
+    """Convert a Kea expire value to (timestamp, label).
+
+    The label is None for a valid timestamp that still has to be formatted.
+    """
+    if not expire_ts or expire_ts == '0':
+        return 0, 'No expiration'
+    try:
+        return int(expire_ts), None
+    except ValueError:
+        return 0, 'Invalid date'
+
+def _parse_expire(expire_ts):
+    """Convert a Kea expire value to (timestamp, readable date)"""
+    expire_timestamp, expire_date = _split_expire(expire_ts)
+    if expire_date is None:
+        try:
+            expire_date = _format_timestamp(expire_timestamp)
+        except (OverflowError, OSError, ValueError):
+            return 0, 'Invalid date'
+    return expire_timestamp, expire_date
+
+def _format_timestamps(timestamps):
+    """Format many epoch timestamps at once, None for any that are out of range.
+
+    With NumPy available, the distinct values within datetime's range are
+    formatted in one vectorized call, each shifted by its own local UTC offset
+    so DST is handled the same way as datetime.fromtimestamp. Anything else is
+    formatted one at a time. The upper bound applies in local time, so values
+    within a day of _MAX_TIMESTAMP are left to the per-item path.
+    """
+    formatted = [None] * len(timestamps)
+    batch = []  # Positions of the values handed to NumPy
     
-    if not os.path.exists(LEASE_FILE):
-        return leases, f"Lease file not found: {LEASE_FILE}"
+    for i, ts in enumerate(timestamps):
+        if np is not None and 0 <= ts <= _MAX_TIMESTAMP - 86400:
+            batch.append(i)
+            continue
+        try:
+            formatted[i] = _format_timestamp(ts)
+        except (OverflowError, OSError, ValueError):
+            pass
     
+    if batch:
+        values, inverse = np.unique(
+            np.fromiter((timestamps[i] for i in batch), dtype=np.int64, count=len(batch)),
+            return_inverse=True,
+        )
+        offsets = np.fromiter(
+            (time.localtime(ts).tm_gmtoff for ts in values.tolist()),
+            dtype=np.int64,
+            count=len(values),
+        )
+        local = (values + offsets).astype('datetime64[s]')
+        dates = np.char.replace(np.datetime_as_string(local, unit='s'), 'T', ' ')
+        for i, expire_date in zip(batch, dates[inverse].tolist()):
+            formatted[i] = expire_date
+    
+    return formatted
+
+def _format_lease_expiries(leases):
+    """Fill in the readable expiry date of leases parsed by _parse_lease_rows"""
+    pending = [lease for lease in leases if lease['expire'] is None]
+    expire_dates = _format_timestamps([lease['expire_timestamp'] for lease in pending])
+    for lease, expire_date in zip(pending, expire_dates):
+        if expire_date is None:
+            lease['expire_timestamp'] = 0
+            expire_date = 'Invalid date'
+        lease['expire'] = expire_date
+
+def _ip_sort_key(ip):
+    """Pack an IP address into a single integer for sorting"""
     try:
-        with open(LEASE_FILE, 'r') as f:
-            # Skip the header line and read CSV
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Only include active leases (state 0 = default/active)
-                if row.get('address') and row.get('state', '0') == '0':
-                    ip_address = row.get('address', '')
-                    expire_ts = row.get('expire', '0')
-                    
-                    # Convert expire timestamp to readable date
-                    if expire_ts and expire_ts != '0':
-                        try:
-                            expire_date = datetime.fromtimestamp(int(expire_ts)).strftime('%Y-%m-%d %H:%M:%S')
-                            expire_timestamp = int(expire_ts)
-                        except:
-                            expire_date = 'Invalid date'
-                            expire_timestamp = 0
-                    else:
-                        expire_date = 'No expiration'
-                        expire_timestamp = 0
-                    
-                    lease_data = {
-                        'ip': ip_address,
-                        'mac': row.get('hwaddr', ''),
-                        'hostname': row.get('hostname', ''),
-                        'expire': expire_date,
-                        'expire_ts': expire_ts,
-                        'expire_timestamp': expire_timestamp,
-                        'subnet_id': row.get('subnet_id', ''),
-                        'client_id': row.get('client_id', ''),
-                        'valid_lifetime': row.get('valid_lifetime', ''),
-                        'state': row.get('state', '0')
-                    }
-                    
-                    # Keep only the lease with the latest expiration time for each IP
-                    if ip_address not in lease_dict or expire_timestamp > lease_dict[ip_address]['expire_timestamp']:
-                        lease_dict[ip_address] = lease_data
+        return _unpack_u32(socket.inet_aton(ip))[0]
+    except OSError:
+        # Not an IPv4 address (e.g. IPv6), let ipaddress handle it
+        return int(ipaddress.ip_address(ip))
+
+def _parse_lease_rows(header, rows):
+    """Build the active lease and per-IP history dicts from raw CSV rows.
+
+    Active leases are stored as (ip_sort_key, lease) pairs so the caller
+    can sort them without recomputing the key. A lease with a valid expiry
+    timestamp has 'expire' set to None until _format_lease_expiries runs.
+    """
+    lease_dict = {}  # Dictionary to track most recent lease per IP
+    history = defaultdict(list)  # Every lease entry per IP, as tuples
+    
+    # Resolve column positions once instead of a dict lookup per field per row
+    idx = {name: i for i, name in enumerate(header)}
+    i_addr, i_hw, i_client = idx['address'], idx['hwaddr'], idx['client_id']
+    i_vl, i_expire, i_subnet = idx['valid_lifetime'], idx['expire'], idx['subnet_id']
+    i_host, i_state = idx['hostname'], idx['state']
+    width = max(i_addr, i_hw, i_client, i_vl, i_expire, i_subnet, i_host, i_state) + 1
+    
+    # Low-cardinality columns share one string object per distinct value
+    intern = {}.setdefault
+    
+    for row in rows:
+        if len(row) < width:  # Blank or truncated line
+            continue
+        ip_address = row[i_addr]
+        if not ip_address:
+            continue
+        expire_ts = row[i_expire]
+        mac = row[i_hw]
+        hostname = row[i_host]
+        subnet_id = intern(row[i_subnet], row[i_subnet])
+        valid_lifetime = intern(row[i_vl], row[i_vl])
+        state = intern(row[i_state], row[i_state])
         
-        # Convert dictionary back to list
-        leases = list(lease_dict.values())
+        # Kept as a plain raw tuple, get_lease_history parses it on demand
+        history[ip_address].append((expire_ts, mac, hostname, subnet_id, state, valid_lifetime))
         
-        # Sort by IP address
-        leases.sort(key=lambda x: tuple(map(int, x['ip'].split('.'))))
-        return leases, None
+        # Only include active leases (state 0 = default/active)
+        if state != '0':
+            continue
         
-    except Exception as e:
-        return [], f"Error reading lease file: {str(e)}"
+        # Dates are formatted in one batch once duplicates are dropped
+        expire_timestamp, expire_date = _split_expire(expire_ts)
+        
+        # Keep only the lease with the latest expiration time for each IP
+        current = lease_dict.get(ip_address)
+        if current is None or expire_timestamp > current[1]['expire_timestamp']:
+            ip_key = current[0] if current else _ip_sort_key(ip_address)
+            lease_dict[ip_address] = ip_key, {
+                'ip': ip_address,
+                'mac': mac,
+                'hostname': hostname,
+                'expire': expire_date,
+                'expire_ts': expire_ts,
+                'expire_timestamp': expire_timestamp,
+                'subnet_id': subnet_id,
+                'client_id': row[i_client],
+                'valid_lifetime': valid_lifetime,
+                'state': state
+            }
+    
+    return lease_dict, history
+
+def _dumps(obj):
+    """Serialize obj to JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+def _render_lease_rows(leases):
+    """Render the lease table body as escaped HTML"""
+    rows = []
+    for lease in leases:
+        hostname = escape(lease['hostname'])
+        rows.append(_ROW_TMPL(
+            ip=escape(lease['ip']),
+            mac=escape(lease['mac']),
+            hostname=hostname,
+            hostname_cell=hostname or '-',
+            expire=escape(lease['expire']),
+            subnet_id=escape(lease['subnet_id'])
+        ))
+    return ''.join(rows)
+
+def _build_snapshot(key):
+    """Parse the lease file into a new snapshot dict"""
+    # Large buffer to cut read syscalls; newline='' as the csv module expects
+    with open(LEASE_FILE, 'r', buffering=1 << 20, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header:
+            lease_dict, history = _parse_lease_rows(header, reader)
+        else:
+            lease_dict, history = {}, {}
+    
+    # Sort by IP address using the packed integer keys
+    keyed = sorted(lease_dict.values(), key=itemgetter(0))
+    leases = [lease for ip_key, lease in keyed]
+    _format_lease_expiries(leases)
+    
+    # /api/leases body, encoded and compressed once per file generation
+    leases_json = _dumps({"leases": leases})
+    
+    return {
+        'key': key,
+        'leases': leases,
+        'by_ip': {lease['ip']: lease for lease in leases},
+        'history_by_ip': dict(history),
+        'with_hostname': sum(1 for lease in leases if lease['hostname']),
+        'expiries': sorted(lease['expire_timestamp'] for lease in leases),
+        'leases_json': leases_json,
+        'leases_json_gz': gzip.compress(leases_json, compresslevel=6),
+        'etag': f'W/"{key[0]}-{key[1]}"',
+        'tbody_html': _render_lease_rows(leases),
+        'error': None,
+    }
+
+def read_lease_file():
+    """Read and parse the Kea lease file, handling duplicates.
+
+    Returns (leases, history_by_ip, error). Active leases and the per-IP
+    history are built in a single pass and published as _SNAPSHOT, which
+    is reused until the file's mtime or size changes.
+    """
+    global _SNAPSHOT
+    
+    with _SNAPSHOT_LOCK:
+        snapshot = _SNAPSHOT
+        if not os.path.exists(LEASE_FILE):
+            snapshot = dict(_EMPTY_SNAPSHOT, error=f"Lease file not found: {LEASE_FILE}")
+        else:
+            try:
+                stat = os.stat(LEASE_FILE)
+                key = (stat.st_mtime_ns, stat.st_size)
+                if snapshot['key'] != key:
+                    snapshot = _build_snapshot(key)
+            except Exception as e:
+                snapshot = dict(_EMPTY_SNAPSHOT, error=f"Error reading lease file: {str(e)}")
+        
+        # Swap in the whole dict so readers never see a half-updated snapshot
+        _SNAPSHOT = snapshot
+    
+    return snapshot['leases'], snapshot['history_by_ip'], snapshot['error']
+
+def _watch_lease_file():
+    """Background loop keeping _SNAPSHOT in sync with the lease file"""
+    while True:
+        time.sleep(LEASE_POLL_INTERVAL)
+        read_lease_file()
+
+def start_lease_watcher():
+    """Load the lease file and start the background refresher if not running"""
+    global _WATCHER
+    
+    with _WATCHER_LOCK:
+        if _WATCHER is None or not _WATCHER.is_alive():
+            read_lease_file()
+            _WATCHER = threading.Thread(target=_watch_lease_file, name='lease-watcher', daemon=True)
+            _WATCHER.start()
+
+def get_snapshot():
+    """Current lease snapshot, as kept up to date by the background refresher"""
+    if _WATCHER is None or not _WATCHER.is_alive():
+        start_lease_watcher()
+    return _SNAPSHOT
 
 def get_lease_history(target_ip):
     """Get all lease entries for a specific IP address"""
+    snapshot = get_snapshot()
+    if snapshot['error']:
+        return [], snapshot['error']
+    
     history = []
+    for expire_ts, mac, hostname, subnet_id, state, valid_lifetime in snapshot['history_by_ip'].get(target_ip, ()):
+        expire_timestamp, expire_date = _parse_expire(expire_ts)
+        history.append({
+            'ip': target_ip,
+            'mac': mac,
+            'hostname': hostname,
+            'expire': expire_date,
+            'expire_ts': expire_ts,
+            'expire_timestamp': expire_timestamp,
+            'subnet_id': subnet_id,
+            'state': state,
+            'valid_lifetime': valid_lifetime
+        })
     
-    if not os.path.exists(LEASE_FILE):
-        return history, f"Lease file not found: {LEASE_FILE}"
+    # Sort by expiration timestamp (most recent first)
+    history.sort(key=itemgetter('expire_timestamp'), reverse=True)
+    return history, None
+
+def get_lease_stats(snapshot, now_timestamp):
+    """Summary counts for a lease snapshot, as shown on the main page"""
+    expiries = snapshot['expiries']
+    return {
+        'total': len(snapshot['leases']),
+        'with_hostname': snapshot['with_hostname'],
+        'not_expired': len(expiries) - bisect_right(expiries, now_timestamp),
+    }
+
+def _compile_subnet_db():
+    """Compile both halves of the subnet fallback into one Hyperscan database"""
+    db = hyperscan.Database()
+    db.compile(
+        expressions=[_SUBNET_ID_RE.pattern, _SUBNET_RANGE_RE.pattern],
+        ids=[0, 1],
+        elements=2,
+        flags=[hyperscan.HS_FLAG_SOM_LEFTMOST] * 2,
+    )
+    return db
+
+_SUBNET_DB = _compile_subnet_db() if hyperscan is not None else None
+
+def _find_subnets_hyperscan(config_content):
+    """Same result as _SUBNET_RE, from a single Hyperscan pass over the config.
+
+    Hyperscan only reports where each half matches; ids are then paired with
+    the next subnet after them, as the lazy .*? in _SUBNET_RE would do.
+    """
+    data = config_content.encode('utf-8')
+    starts = (set(), set())
     
-    try:
-        with open(LEASE_FILE, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row.get('address') == target_ip:
-                    expire_ts = row.get('expire', '0')
-                    if expire_ts and expire_ts != '0':
-                        try:
-                            expire_date = datetime.fromtimestamp(int(expire_ts)).strftime('%Y-%m-%d %H:%M:%S')
-                        except:
-                            expire_date = 'Invalid date'
-                    else:
-                        expire_date = 'No expiration'
-                    
-                    history.append({
-                        'ip': row.get('address', ''),
-                        'mac': row.get('hwaddr', ''),
-                        'hostname': row.get('hostname', ''),
-                        'expire': expire_date,
-                        'expire_ts': expire_ts,
-                        'subnet_id': row.get('subnet_id', ''),
-                        'state': row.get('state', ''),
-                        'valid_lifetime': row.get('valid_lifetime', '')
-                    })
-        
-        # Sort by expiration timestamp (most recent first)
-        history.sort(key=lambda x: int(x.get('expire_ts', '0')), reverse=True)
-        return history, None
-        
-    except Exception as e:
-        return [], f"Error reading lease file: {str(e)}"
+    def on_match(pattern_id, start, end, flags, context):
+        starts[pattern_id].add(start)
+    
+    _SUBNET_DB.scan(data, match_event_handler=on_match)
+    
+    subnet_starts = sorted(starts[1])
+    subnets = {}
+    pos = 0
+    j = 0
+    for id_start in sorted(starts[0]):
+        if id_start < pos:
+            continue
+        id_match = _SUBNET_ID_RE.match(data, id_start)
+        while j < len(subnet_starts) and subnet_starts[j] < id_match.end():
+            j += 1
+        if j == len(subnet_starts):
+            break
+        range_match = _SUBNET_RANGE_RE.match(data, subnet_starts[j])
+        subnets[id_match.group(1).decode()] = range_match.group(1).decode()
+        pos = range_match.end()
+        j += 1
+    return subnets
 
 def get_subnet_info():
-    """Extract subnet information from Kea config file"""
+    """Extract subnet information from Kea config file.
+
+    The result is cached and reused until the config file's mtime changes.
+    """
+    global _SUBNET_CACHE
+    
+    try:
+        stat = os.stat(KEA_CONFIG_FILE)
+    except OSError:
+        return {}
+    
+    cached_mtime, cached_subnets = _SUBNET_CACHE
+    if stat.st_mtime_ns == cached_mtime:
+        return cached_subnets
+    
     subnets = {}
     
     try:
-        if os.path.exists(KEA_CONFIG_FILE):
-            with open(KEA_CONFIG_FILE, 'r') as f:
-                config_content = f.read()
-                # Try to parse as JSON first
-                try:
-                    config_json = json.loads(config_content)
-                    if 'Dhcp4' in config_json and 'subnet4' in config_json['Dhcp4']:
-                        for subnet in config_json['Dhcp4']['subnet4']:
-                            subnet_id = str(subnet.get('id', ''))
-                            subnet_range = subnet.get('subnet', '')
-                            if subnet_id and subnet_range:
-                                subnets[subnet_id] = subnet_range
-                except json.JSONDecodeError:
-                    # Fallback to regex parsing
-                    subnet_pattern = r'"id":\s*(\d+).*?"subnet":\s*"([^"]+)"'
-                    matches = re.findall(subnet_pattern, config_content, re.DOTALL)
-                    
-                    for subnet_id, subnet_range in matches:
-                        subnets[subnet_id] = subnet_range
+        with open(KEA_CONFIG_FILE, 'r') as f:
+            config_content = f.read()
+            # Try to parse as JSON first
+            try:
+                config_json = json.loads(config_content)
+                if 'Dhcp4' in config_json and 'subnet4' in config_json['Dhcp4']:
+                    subnets = {
+                        str(subnet.get('id', '')): subnet.get('subnet', '')
+                        for subnet in config_json['Dhcp4']['subnet4']
+                        if str(subnet.get('id', '')) and subnet.get('subnet', '')
+                    }
+            except json.JSONDecodeError:
+                # Fallback to regex parsing
+                if _SUBNET_DB is not None:
+                    subnets = _find_subnets_hyperscan(config_content)
+                else:
+                    subnets = {subnet_id: subnet_range for subnet_id, subnet_range in _SUBNET_RE.findall(config_content)}
+        
+        _SUBNET_CACHE = (stat.st_mtime_ns, subnets)
     except Exception as e:
         print(f"Could not read Kea config: {e}")
     
     return subnets
 
-def generate_reservation_config(ip, mac, hostname=""):
+def generate_reservation_config(ip, mac, hostname="", pretty=False):
     """Generate Kea DHCP4 reservation configuration"""
+    mac_lc = mac.lower()
+    host_fragment = f', "hostname": "{hostname}"' if hostname else ''
     
     reservation = {
-        "hw-address": mac.lower(),
+        "hw-address": mac_lc,
         "ip-address": ip
     }
     
@@ -156,73 +524,68 @@ def generate_reservation_config(ip, mac, hostname=""):
         "reservations": [reservation]
     }
     
-    # Pretty print the JSON
-    json_config = json.dumps(config_snippet, indent=2)
+    # Compact JSON unless the caller wants it indented for display
+    if pretty:
+        json_config = json.dumps(config_snippet, indent=2)
+    else:
+        json_config = json.dumps(config_snippet, separators=(',', ':'))
     
     # Generate instructions
-    instructions = f"""
-To add this static reservation to your Kea DHCP4 configuration:
-
-1. Edit your Kea configuration file:
-   vi {KEA_CONFIG_FILE}
-
-2. Find the subnet4 section for your network and add the reservation:
-
-   "subnet4": [
-     {{
-       "subnet": "192.168.20.0/24",
-       "pools": [
-         {{ "pool": "192.168.20.100-192.168.20.200" }}
-       ],
-       "reservations": [
-         {{
-           "hw-address": "{mac.lower()}",
-           "ip-address": "{ip}"{', "hostname": "' + hostname + '"' if hostname else ''}
-         }}
-       ]
-     }}
-   ]
-
-3. Test the configuration:
-   kea-dhcp4 -t {KEA_CONFIG_FILE}
-
-4. Restart Kea DHCP4:
-   /etc/init.d/kea-dhcp4 restart
-
-5. Check the status:
-   /etc/init.d/kea-dhcp4 status
-"""
+    instructions = _INSTRUCTIONS_TMPL(
+        config_file=KEA_CONFIG_FILE,
+        mac=mac_lc,
+        ip=ip,
+        host_line=host_fragment
+    )
     
     return json_config, instructions
 
+def fast_json(obj):
+    """Build a JSON response, like jsonify but with a faster encoder"""
+    return app.response_class(_dumps(obj), mimetype='application/json')
+
 @app.route('/')
 def index():
     """Main page showing lease table"""
-    leases, error = read_lease_file()
+    snapshot = get_snapshot()
     subnets = get_subnet_info()
-    return render_template('lease_manager.html', leases=leases, error=error, subnets=subnets, now_timestamp=int(datetime.now().timestamp()))
+    now_timestamp = int(datetime.now().timestamp())
+    stats = get_lease_stats(snapshot, now_timestamp)
+    return render_template('lease_manager.html', leases=snapshot['leases'], error=snapshot['error'], subnets=subnets, stats=stats, leases_etag=snapshot['etag'], tbody_html=snapshot['tbody_html'], now_timestamp=now_timestamp)
 
 @app.route('/api/leases')
 def api_leases():
     """API endpoint to get lease data"""
-    leases, error = read_lease_file()
-    if error:
-        return jsonify({"error": error}), 500
-    return jsonify({"leases": leases})
+    snapshot = get_snapshot()
+    if snapshot['error']:
+        return fast_json({"error": snapshot['error']}), 500
+    
+    # Nothing to send if the client already has this generation, otherwise
+    # serve the pre-encoded body, compressed if the client accepts gzip
+    if request.headers.get('If-None-Match') == snapshot['etag']:
+        response = app.response_class(status=304)
+    elif request.accept_encodings['gzip']:
+        response = app.response_class(snapshot['leases_json_gz'], mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = app.response_class(snapshot['leases_json'], mimetype='application/json')
+    response.headers['ETag'] = snapshot['etag']
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 @app.route('/api/lease-history/<ip>')
 def api_lease_history(ip):
     """API endpoint to get lease history for specific IP"""
     history, error = get_lease_history(ip)
     if error:
-        return jsonify({"error": error}), 500
-    return jsonify({"history": history})
+        return fast_json({"error": error}), 500
+    return fast_json({"history": history})
 
 @app.route('/api/subnets')
 def api_subnets():
     """API endpoint to get subnet information"""
     subnets = get_subnet_info()
-    return jsonify({"subnets": subnets})
+    return fast_json({"subnets": subnets})
 
 @app.route('/api/reservation', methods=['POST'])
 def api_reservation():
@@ -231,13 +594,17 @@ def api_reservation():
     ip = data.get('ip', '')
     mac = data.get('mac', '')
     hostname = data.get('hostname', '')
+    pretty = bool(data.get('pretty', False))
     
     if not ip or not mac:
-        return jsonify({"error": "IP and MAC address are required"}), 400
+        return fast_json({"error": "IP and MAC address are required"}), 400
+    
+    if ip not in get_snapshot()['by_ip']:
+        return fast_json({"error": f"No active lease found for {ip}"}), 400
     
-    json_config, instructions = generate_reservation_config(ip, mac, hostname)
+    json_config, instructions = generate_reservation_config(ip, mac, hostname, pretty)
     
-    return jsonify({
+    return fast_json({
         "json_config": json_config,
         "instructions": instructions
     })
@@ -245,6 +612,7 @@ def api_reservation():
 @app.route('/refresh')
 def refresh():
     """Refresh lease data"""
+    read_lease_file()
     return index()
 
 # Enhanced HTML Template
@@ -540,19 +908,19 @@ HTML_TEMPLATE = '''
 
         <div class="stats">
             <div class="stat-box">
-                <div class="stat-number" id="totalLeases">{{ leases|length }}</div>
+                <div class="stat-number" id="totalLeases">{{ stats.total }}</div>
                 <div class="stat-label">Active Leases</div>
             </div>
             <div class="stat-box">
-                <div class="stat-number">{{ leases|selectattr('hostname')|list|length }}</div>
+                <div class="stat-number" id="hostnameLeases">{{ stats.with_hostname }}</div>
                 <div class="stat-label">With Hostnames</div>
             </div>
             <div class="stat-box">
-                <div class="stat-number">{{ (leases|selectattr('expire_timestamp')|map(attribute='expire_timestamp')|select('>', now_timestamp)|list|length) if now_timestamp else 'N/A' }}</div>
+                <div class="stat-number" id="notExpiredLeases">{{ stats.not_expired }}</div>
                 <div class="stat-label">Not Expired</div>
             </div>
             <div class="stat-box">
-                <div class="stat-number" id="visibleLeases">{{ leases|length }}</div>
+                <div class="stat-number" id="visibleLeases">{{ stats.total }}</div>
                 <div class="stat-label">Visible</div>
             </div>
         </div>
@@ -570,23 +938,7 @@ HTML_TEMPLATE = '''
                     </tr>
                 </thead>
                 <tbody>
-                    {% for lease in leases %}
-                    <tr class="lease-row">
-                        <td class="ip-cell">{{ lease.ip }}</td>
-                        <td class="mac-cell">{{ lease.mac }}</td>
-                        <td class="hostname-cell">{{ lease.hostname or '-' }}</td>
-                        <td>{{ lease.expire }}</td>
-                        <td>{{ lease.subnet_id }}</td>
-                        <td>
-                            <button class="action-btn" onclick="showReservation('{{ lease.ip }}', '{{ lease.mac }}', '{{ lease.hostname }}')">
-                                Make Static
-                            </button>
-                            <button class="history-btn" onclick="showHistory('{{ lease.ip }}')">
-                                History
-                            </button>
-                        </td>
-                    </tr>
-                    {% endfor %}
+                    {{ tbody_html|safe }}
                 </tbody>
             </table>
         </div>
@@ -670,7 +1022,8 @@ HTML_TEMPLATE = '''
                 body: JSON.stringify({
                     ip: ip,
                     mac: mac,
-                    hostname: hostname
+                    hostname: hostname,
+                    pretty: true
                 })
             })
             .then(response => response.json())
@@ -788,14 +1141,87 @@ HTML_TEMPLATE = '''
             }
         }
 
-        // Auto-refresh every 30 seconds (only if no modals are open)
+        function escapeHtml(value) {
+            return String(value).replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c]));
+        }
+
+        function renderLeaseRow(lease) {
+            const ip = escapeHtml(lease.ip);
+            const mac = escapeHtml(lease.mac);
+            const hostname = escapeHtml(lease.hostname);
+            return `
+                <tr class="lease-row">
+                    <td class="ip-cell">${ip}</td>
+                    <td class="mac-cell">${mac}</td>
+                    <td class="hostname-cell">${hostname || '-'}</td>
+                    <td>${escapeHtml(lease.expire)}</td>
+                    <td>${escapeHtml(lease.subnet_id)}</td>
+                    <td>
+                        <button class="action-btn" onclick="showReservation('${ip}', '${mac}', '${hostname}')">
+                            Make Static
+                        </button>
+                        <button class="history-btn" onclick="showHistory('${ip}')">
+                            History
+                        </button>
+                    </td>
+                </tr>
+            `;
+        }
+
+        // ETag of the lease data currently shown, sent back when polling
+        let leasesEtag = {{ leases_etag|tojson }};
+
+        function refreshLeases() {
+            fetch('/api/leases', {headers: leasesEtag ? {'If-None-Match': leasesEtag} : {}})
+            .then(response => {
+                // 304 means the lease file has not changed since the last poll
+                if (response.status === 304) {
+                    return null;
+                }
+                if (!response.ok) {
+                    // Let the server render its error banner (e.g. lease file missing)
+                    location.reload();
+                    return undefined;
+                }
+                leasesEtag = response.headers.get('ETag');
+                return response.json();
+            })
+            .then(data => {
+                if (data === undefined) {
+                    return;
+                }
+                document.getElementById('lastUpdate').textContent = new Date().toLocaleString();
+                if (data === null) {
+                    return;
+                }
+
+                const table = document.getElementById('leasesTable');
+                if (!table || data.leases.length === 0) {
+                    // The page layout changes with or without leases, let the server render it
+                    location.reload();
+                    return;
+                }
+
+                const now = Date.now() / 1000;
+                table.tBodies[0].innerHTML = data.leases.map(renderLeaseRow).join('');
+                document.getElementById('totalLeases').textContent = data.leases.length;
+                document.getElementById('hostnameLeases').textContent = data.leases.filter(lease => lease.hostname).length;
+                document.getElementById('notExpiredLeases').textContent = data.leases.filter(lease => lease.expire_timestamp > now).length;
+                filterTable();
+            })
+            .catch(error => {
+                console.error('Lease refresh failed:', error);
+            });
+        }
+
+        // Poll for lease changes every 30 seconds (only if no modals are open)
         setInterval(function() {
             const reservationModal = document.getElementById('reservationModal');
             const historyModal = document.getElementById('historyModal');
             
             if ((!reservationModal.style.display || reservationModal.style.display === 'none') &&
                 (!historyModal.style.display || historyModal.style.display === 'none')) {
-                location.reload();
+                refreshLeases();
             }
         }, 30000);
 
@@ -826,4 +1252,8 @@ if __name__ == '__main__':
     print("- 📈 Enhanced statistics")
     print("- 🎨 Improved responsive design")
     
-    app.run(debug=False, host='0.0.0.0', port=5001)
\ No newline at end of file
+    start_lease_watcher()
+    if serve is not None:
+        serve(app, host='0.0.0.0', port=5001, threads=8)
+    else:
+        app.run(debug=False, host='0.0.0.0', port=5001)
\ No newline at end of file